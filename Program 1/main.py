@@ -1,5 +1,20 @@
 from collections import defaultdict
+from typing import (
+    Dict,
+    List,
+    NamedTuple,
+)
 import heapq
+import math
+
+
+class Graph(NamedTuple):
+    name_to_id: Dict[str, int]
+    id_to_name: List[str]
+    adj_indptr: List[int]  # neighbors of city u are adj_indices[adj_indptr[u]:adj_indptr[u + 1]]
+    adj_indices: List[int]
+    weights: List[float]  # length of the edge to adj_indices[i]
+    positions: List[List[float]]
 
 
 def load_graph(adjacencies, coordinates):
@@ -12,52 +27,84 @@ def load_graph(adjacencies, coordinates):
 
     coords = {city: [float(c) for c in coords[::-1]] for city, *coords in (line.split() for line in coordinates)}
 
-    return {
-        city: {
-            "neighbors": [neighbor for neighbor in adj[city] if neighbor in coords],
-            "position": pos,
-        }
-        for city, pos in coords.items()
-    }
+    id_to_name = list(coords)
+    name_to_id = {city: i for i, city in enumerate(id_to_name)}
 
+    adj_indptr = [0]
+    adj_indices = []
+    for city in id_to_name:
+        adj_indices.extend(dict.fromkeys(name_to_id[neighbor] for neighbor in adj[city] if neighbor in coords))
+        adj_indptr.append(len(adj_indices))
 
-def euclidean_distance(x1, y1, x2, y2):
-    return ((x1 - x2)**2 + (y1 - y2)**2) ** 1/2  # assuming the earth is flat :P
+    positions = list(coords.values())
+    weights = [
+        euclidean_distance(*positions[city], *positions[adj_indices[i]])
+        for city in range(len(id_to_name))
+        for i in range(adj_indptr[city], adj_indptr[city + 1])
+    ]
 
+    return Graph(name_to_id, id_to_name, adj_indptr, adj_indices, weights, positions)
 
-def best_first_search(graph, source, destination):
-    closed = {}  # key is city name, value is parent
-    open_queue = [(0.0, source, None)]  # heap of (dist, city, parent)
 
-    while open_queue and destination not in closed:
-        dist, examining, parent = heapq.heappop(open_queue)
-        if examining in closed:  # node may be added by multiple parents
+def euclidean_distance(x1, y1, x2, y2):
+    return math.hypot(x1 - x2, y1 - y2)  # assuming the earth is flat :P
+
+
+def a_star_search(graph: Graph, source: int, destination: int):
+    num_cities = len(graph.id_to_name)
+    adj_indptr, adj_indices, weights, positions = graph.adj_indptr, graph.adj_indices, graph.weights, graph.positions
+    closed = [False] * num_cities
+    parents = [None] * num_cities
+    open_queue = [(0.0, 0.0, source, None)]  # heap of (dist + heuristic, dist, city, parent)
+    best_dist = [math.inf] * num_cities  # shortest distance from source found so far
+    best_dist[source] = 0.0
+    heuristics = [None] * num_cities  # cities are often reached from several parents, so only compute each heuristic once
+    destination_position = positions[destination]
+
+    while open_queue and not closed[destination]:
+        _, dist, examining, parent = open_queue[0]
+        if closed[examining] or dist > best_dist[examining]:  # a shorter path to this city was found after queueing
+            heapq.heappop(open_queue)
             continue
 
-        for neighbor in graph[examining]['neighbors']:
-            if neighbor not in closed:  # no use adding them if they'll just be skipped anyway
-                heuristic = euclidean_distance(
-                    *graph[neighbor]["position"],
-                    *graph[source]["position"],  # s/source/destination for greedy best-first
-                )
-
-                heapq.heappush(
-                    open_queue,
-                    (heuristic, neighbor, examining),
-                )
-
-        closed[examining] = parent
+        to_open = []
+        for i in range(adj_indptr[examining], adj_indptr[examining + 1]):
+            neighbor = adj_indices[i]
+            if not closed[neighbor]:  # no use adding them if they'll just be skipped anyway
+                neighbor_dist = dist + weights[i]
+                if neighbor_dist < best_dist[neighbor]:
+                    best_dist[neighbor] = neighbor_dist
+
+                    heuristic = heuristics[neighbor]
+                    if heuristic is None:
+                        # straight line distance never overestimates, so the first path to reach destination is optimal
+                        heuristic = heuristics[neighbor] = euclidean_distance(
+                            *positions[neighbor],
+                            *destination_position,
+                        )
+
+                    to_open.append((neighbor_dist + heuristic, neighbor_dist, neighbor, examining))
+
+        if to_open:  # pop examining and push the first neighbor in a single sift
+            heapq.heapreplace(open_queue, to_open[0])
+            for entry in to_open[1:]:
+                heapq.heappush(open_queue, entry)
+        else:
+            heapq.heappop(open_queue)
+
+        closed[examining] = True
+        parents[examining] = parent
 
     path = [destination]
 
-    while parent := closed.get(path[-1]):
+    while (parent := parents[path[-1]]) is not None:  # city 0 is falsy
         path.append(parent)
 
     return path[::-1]
 
 
-def get_city_selection(graph, prompt, error_message):
-    while (selection := input(prompt)) not in graph:
+def get_city_selection(cities, prompt, error_message):
+    while (selection := input(prompt)) not in cities:
         print(error_message)
 
     return selection
@@ -68,11 +115,11 @@ def main():
         graph = load_graph(a, c)
 
     sorry = "Sorry! That city is not in our database :("
-    source = get_city_selection(graph, "Where would you like to navigate from? ", sorry)
-    destination = get_city_selection(graph, "Where would you like to navigate to? ", sorry)
+    source = get_city_selection(graph.name_to_id, "Where would you like to navigate from? ", sorry)
+    destination = get_city_selection(graph.name_to_id, "Where would you like to navigate to? ", sorry)
 
-    path = best_first_search(graph, source, destination)
-    print(f"Here's a path between {source} and {destination}:", " → ".join(path))
+    path = a_star_search(graph, graph.name_to_id[source], graph.name_to_id[destination])
+    print(f"Here's a path between {source} and {destination}:", " → ".join(graph.id_to_name[city] for city in path))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,147 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+# Compiled alternative to fitness_numba for when numba isn't installed, build with
+#     python setup.py build_ext --inplace
+from libc.stdint cimport int64_t
+from libc.stdlib cimport calloc, free
+from libc.string cimport memset
+
+
+cdef inline int popcount(unsigned int x) nogil:
+    cdef int count = 0
+    while x:
+        x &= x - 1
+        count += 1
+
+    return count
+
+
+cdef double get_fitness(
+    const signed char[::1] facilitators, const signed char[::1] rooms, const signed char[::1] times,
+    const int64_t[::1] room_cluster, const double[:, ::1] capacity_fitness, const double[:, ::1] facilitator_fitness,
+    Py_ssize_t num_facilitators, Py_ssize_t num_rooms, Py_ssize_t num_times,
+    Py_ssize_t tyler, Py_ssize_t sla101a, Py_ssize_t sla101b, Py_ssize_t sla191a, Py_ssize_t sla191b,
+    int *room_time_load, int *facilitator_time_load, int *facilitator_load, unsigned int *building_groups,
+) noexcept nogil:
+    cdef double fitness = 0.0
+    cdef Py_ssize_t a, f, r, t, i, j, k, sla101, sla191
+    cdef Py_ssize_t sla101s[2]
+    cdef Py_ssize_t sla191s[2]
+    cdef int load, gap, num_groups, num_rewarded
+    cdef unsigned int groups, prev
+
+    memset(room_time_load, 0, num_rooms * num_times * sizeof(int))
+    memset(facilitator_time_load, 0, num_facilitators * num_times * sizeof(int))
+    memset(facilitator_load, 0, num_facilitators * sizeof(int))
+    memset(building_groups, 0, num_facilitators * num_times * sizeof(unsigned int))  # bitmask of building clusters
+
+    # activity fitness
+    for a in range(rooms.shape[0]):
+        f, r, t = facilitators[a], rooms[a], times[a]
+        room_time_load[r * num_times + t] += 1
+        facilitator_load[f] += 1
+        facilitator_time_load[f * num_times + t] += 1
+        building_groups[f * num_times + t] |= 1u << room_cluster[r]
+
+        fitness += capacity_fitness[a, r] + facilitator_fitness[a, f]
+
+    # penalize room/time conflicts
+    for i in range(num_rooms * num_times):
+        load = room_time_load[i]
+        if load >= 2:
+            fitness -= 0.5 * load
+
+    # penalize schedules that give professors too many or too few activities
+    for f in range(num_facilitators):
+        load = facilitator_load[f]
+        if f == tyler and load < 2:
+            continue
+
+        if load == 1 or load == 2:
+            fitness -= 0.4
+        elif load > 4:
+            fitness -= 0.5
+
+    # penalize schedules that require facilitators to be in multiple places at once
+    for i in range(num_facilitators * num_times):
+        if facilitator_time_load[i] > 1:
+            fitness -= 0.2
+
+    # penalize schedules that require the instructor to travel far between consecutive activities, otherwise reward
+    for f in range(num_facilitators):
+        prev = 0
+        for t in range(num_times):
+            groups = building_groups[f * num_times + t]
+            num_groups = popcount(groups)
+            if prev == 0:
+                num_rewarded = num_groups
+            elif popcount(prev) == 1:
+                num_rewarded = popcount(groups & prev)
+            else:
+                num_rewarded = 0
+
+            fitness += 0.5 * num_rewarded - 0.4 * (num_groups - num_rewarded)
+            prev = groups
+
+    # "activity-specific adjustments"
+    gap = abs(times[sla101a] - times[sla101b])
+    if gap > 4:
+        fitness += 0.5
+    elif gap == 0:
+        fitness -= 0.5
+
+    gap = abs(times[sla191a] - times[sla191b])
+    if gap > 4:
+        fitness += 0.5
+    elif gap == 0:
+        fitness -= 0.5
+
+    sla101s[:] = [sla101a, sla101b]
+    sla191s[:] = [sla191a, sla191b]
+    for j in range(2):
+        for k in range(2):
+            sla101, sla191 = sla101s[j], sla191s[k]
+            gap = abs(times[sla101] - times[sla191])
+            if gap == 1:
+                if room_cluster[rooms[sla101]] == room_cluster[rooms[sla191]]:
+                    fitness += 0.5
+                else:
+                    fitness -= 0.4
+            elif gap == 2:
+                fitness += 0.25
+            elif gap == 0:
+                fitness -= 0.25
+
+    return fitness
+
+
+def evaluate_population(
+    const signed char[:, ::1] pop_facilitators, const signed char[:, ::1] pop_rooms, const signed char[:, ::1] pop_times,
+    const int64_t[::1] room_cluster, const double[:, ::1] capacity_fitness, const double[:, ::1] facilitator_fitness,
+    Py_ssize_t num_facilitators, Py_ssize_t num_rooms, Py_ssize_t num_times,
+    Py_ssize_t tyler, Py_ssize_t sla101a, Py_ssize_t sla101b, Py_ssize_t sla191a, Py_ssize_t sla191b,
+    double[::1] out,
+):
+    cdef Py_ssize_t i
+    cdef int *room_time_load = <int *> calloc(num_rooms * num_times, sizeof(int))
+    cdef int *facilitator_time_load = <int *> calloc(num_facilitators * num_times, sizeof(int))
+    cdef int *facilitator_load = <int *> calloc(num_facilitators, sizeof(int))
+    cdef unsigned int *building_groups = <unsigned int *> calloc(num_facilitators * num_times, sizeof(unsigned int))
+
+    try:
+        if not (room_time_load and facilitator_time_load and facilitator_load and building_groups):
+            raise MemoryError()
+
+        with nogil:
+            for i in range(pop_rooms.shape[0]):
+                out[i] = get_fitness(
+                    pop_facilitators[i], pop_rooms[i], pop_times[i],
+                    room_cluster, capacity_fitness, facilitator_fitness,
+                    num_facilitators, num_rooms, num_times,
+                    tyler, sla101a, sla101b, sla191a, sla191b,
+                    room_time_load, facilitator_time_load, facilitator_load, building_groups,
+                )
+    finally:
+        free(room_time_load)
+        free(facilitator_time_load)
+        free(facilitator_load)
+        free(building_groups)
@@ -0,0 +1,120 @@
+import numba
+import numpy as np
+
+
+@numba.njit(cache=True)
+def popcount(x):
+    count = 0
+    while x:
+        x &= x - 1
+        count += 1
+
+    return count
+
+
+@numba.njit(cache=True)
+def get_fitness(
+    facilitators, rooms, times,
+    room_cluster, capacity_fitness, facilitator_fitness,
+    num_facilitators, num_rooms, num_times,
+    tyler, sla101a, sla101b, sla191a, sla191b,
+):
+    fitness = 0.0
+
+    room_time_load = np.zeros(num_rooms * num_times, np.int32)
+    facilitator_time_load = np.zeros(num_facilitators * num_times, np.int32)
+    facilitator_load = np.zeros(num_facilitators, np.int32)
+    building_groups = np.zeros(num_facilitators * num_times, np.int32)  # bitmask of building clusters
+
+    # activity fitness
+    for a in range(len(rooms)):
+        f, r, t = facilitators[a], rooms[a], times[a]
+        room_time_load[r * num_times + t] += 1
+        facilitator_load[f] += 1
+        facilitator_time_load[f * num_times + t] += 1
+        building_groups[f * num_times + t] |= 1 << room_cluster[r]
+
+        fitness += capacity_fitness[a, r] + facilitator_fitness[a, f]
+
+    # penalize room/time conflicts
+    for load in room_time_load:
+        if load >= 2:
+            fitness -= 0.5 * load
+
+    # penalize schedules that give professors too many or too few activities
+    for f in range(num_facilitators):
+        load = facilitator_load[f]
+        if f == tyler and load < 2:
+            continue
+
+        if load == 1 or load == 2:
+            fitness -= 0.4
+        elif load > 4:
+            fitness -= 0.5
+
+    # penalize schedules that require facilitators to be in multiple places at once
+    for load in facilitator_time_load:
+        if load > 1:
+            fitness -= 0.2
+
+    # penalize schedules that require the instructor to travel far between consecutive activities, otherwise reward
+    for f in range(num_facilitators):
+        prev = 0
+        for t in range(num_times):
+            groups = building_groups[f * num_times + t]
+            num_groups = popcount(groups)
+            if prev == 0:
+                num_rewarded = num_groups
+            elif popcount(prev) == 1:
+                num_rewarded = popcount(groups & prev)
+            else:
+                num_rewarded = 0
+
+            fitness += 0.5 * num_rewarded - 0.4 * (num_groups - num_rewarded)
+            prev = groups
+
+    # "activity-specific adjustments"
+    sla101_gap = abs(times[sla101a] - times[sla101b])
+    if sla101_gap > 4:
+        fitness += 0.5
+    elif sla101_gap == 0:
+        fitness -= 0.5
+
+    sla191_gap = abs(times[sla191a] - times[sla191b])
+    if sla191_gap > 4:
+        fitness += 0.5
+    elif sla191_gap == 0:
+        fitness -= 0.5
+
+    for sla101 in (sla101a, sla101b):
+        for sla191 in (sla191a, sla191b):
+            gap = abs(times[sla101] - times[sla191])
+            if gap == 1:
+                if room_cluster[rooms[sla101]] == room_cluster[rooms[sla191]]:
+                    fitness += 0.5
+                else:
+                    fitness -= 0.4
+            elif gap == 2:
+                fitness += 0.25
+            elif gap == 0:
+                fitness -= 0.25
+
+    return fitness
+
+
+@numba.njit(parallel=True, cache=True)
+def evaluate_population(
+    pop_facilitators, pop_rooms, pop_times,
+    room_cluster, capacity_fitness, facilitator_fitness,
+    num_facilitators, num_rooms, num_times,
+    tyler, sla101a, sla101b, sla191a, sla191b,
+    out,
+):
+    # individuals are independent, so evaluate them across all cores
+    for i in numba.prange(len(pop_rooms)):
+        out[i] = get_fitness(
+            pop_facilitators[i], pop_rooms[i], pop_times[i],
+            room_cluster, capacity_fitness, facilitator_fitness,
+            num_facilitators, num_rooms, num_times,
+            tyler, sla101a, sla101b, sla191a, sla191b,
+        )
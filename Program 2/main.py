@@ -1,17 +1,37 @@
-from collections import Counter, defaultdict
-from dataclasses import dataclass
+from collections import deque
+from dataclasses import dataclass, field
 from itertools import count
 from typing import (
+    Dict,
     List,
     Optional,
-    Set,
-    Dict,
+    Tuple,
 )
 import json
-import random
 
-from scipy.special import softmax
-from numpy.random import choice
+import numpy as np
+
+# compiled fitness kernels are optional, get_fitness_batch is used if neither is available
+try:
+    import fitness_numba as fitness_kernel
+except ImportError:
+    try:
+        import fitness_cython as fitness_kernel  # needs `python setup.py build_ext --inplace`
+    except ImportError:
+        fitness_kernel = None
+
+
+BUILDING_CLUSTERS = {
+    'Roman': 2,
+    'Beach': 2,
+    'Slater': 1,
+    'Loft': 1,
+    'Logos': 1,
+    'Frank': 1,
+}
+
+# number of set bits in each possible building cluster bitmask
+CLUSTER_MASK_POPCOUNT = np.array([bin(mask).count('1') for mask in range(2 << max(BUILDING_CLUSTERS.values()))])
 
 
 @dataclass(frozen=True)
@@ -27,13 +47,23 @@ class Activity:
     course_number: int
     section: Optional[str]
     expected_enrollment: int
-    preferred_facilitators: Set[str]
-    other_facilitators: Set[str]
 
     def get_id(self):
         return f"{self.subject}{self.course_number:03}{self.section or ''}"
 
 
+def get_capacity_fitness(activity: Activity, room: Room):
+    capacity_ratio = room.capacity / activity.expected_enrollment
+    if capacity_ratio < 1:
+        return -0.5
+    elif capacity_ratio > 3:
+        return -0.2
+    elif capacity_ratio > 6:
+        return -0.4
+    else:
+        return 0.3
+
+
 @dataclass
 class Schedule:
     activities: List[Activity]
@@ -41,177 +71,212 @@ class Schedule:
     rooms: List[Room]
     times: List[int]
 
+    # lookup tables for the fitness functions, indexed by activity/facilitator/room index
+    preferred: np.ndarray  # [activity, facilitator]
+    other: np.ndarray  # [activity, facilitator]
+
+    activity_ix: Dict[str, int] = field(init=False)
+    sla101: Tuple[int, int] = field(init=False)  # activity indices of the sections with special rules
+    sla191: Tuple[int, int] = field(init=False)
+    room_cluster: np.ndarray = field(init=False)
+    capacity_fitness: np.ndarray = field(init=False)  # [activity, room]
+    facilitator_fitness: np.ndarray = field(init=False)  # [activity, facilitator]
+
+    def __post_init__(self):
+        # time indices are used as hours (t - 1 is the previous hour), so keep them in chronological order
+        self.times = sorted(self.times)
+        self.activity_ix = {activity.get_id(): i for i, activity in enumerate(self.activities)}
+        self.sla101 = self.activity_ix['SLA101A'], self.activity_ix['SLA101B']
+        self.sla191 = self.activity_ix['SLA191A'], self.activity_ix['SLA191B']
+        self.room_cluster = np.array([BUILDING_CLUSTERS[room.building] for room in self.rooms])
+        self.capacity_fitness = np.array([
+            [get_capacity_fitness(activity, room) for room in self.rooms]
+            for activity in self.activities
+        ])
+        self.facilitator_fitness = np.where(self.preferred, 0.5, np.where(self.other, 0.2, -0.1))
+
 
 @dataclass
-class ActivityAssignment:
-    activity: Activity
-    facilitator: str
-    room: Room
-    time: int
+class Population:
+    # struct of arrays: [individual, activity] -> index into Schedule.facilitators/rooms/times
+    facilitators: np.ndarray
+    rooms: np.ndarray
+    times: np.ndarray
 
     @staticmethod
-    def make_random_assignment(schedule: Schedule, activity: Activity) -> 'ActivityAssignment':
-        return ActivityAssignment(
-            activity,
-            random.choice(schedule.facilitators),
-            random.choice(schedule.rooms),
-            random.choice(schedule.times),
+    def make_empty(schedule: Schedule, size: int) -> 'Population':
+        shape = (size, len(schedule.activities))
+        return Population(*(np.empty(shape, dtype=np.int8) for _ in range(3)))
+
+    @staticmethod
+    def make_random(schedule: Schedule, size: int, rng: np.random.Generator) -> 'Population':
+        shape = (size, len(schedule.activities))
+        return Population(
+            rng.integers(len(schedule.facilitators), size=shape, dtype=np.int8),
+            rng.integers(len(schedule.rooms), size=shape, dtype=np.int8),
+            rng.integers(len(schedule.times), size=shape, dtype=np.int8),
         )
 
+    def axes(self):
+        return self.facilitators, self.rooms, self.times
 
-@dataclass
-class ScheduleAssignment:
-    schedule: Schedule
-    activities: Dict[str, ActivityAssignment]
+    def __len__(self):
+        return len(self.rooms)
 
-    @staticmethod
-    def make_random_assignment(schedule: Schedule) -> 'ScheduleAssignment':
-        activities = {
-            activity.get_id(): ActivityAssignment.make_random_assignment(schedule, activity)
-            for activity in schedule.activities
-        }
-        return ScheduleAssignment(schedule, activities)
-
-
-def get_fitness(schedule: ScheduleAssignment):
-    fitness = 0
-
-    room_time_load = Counter()
-    facilitator_time_load = Counter()
-    facilitator_time_building_schedule = defaultdict(set)
-    facilitator_load = defaultdict(lambda: 0)
-
-    building_clusters = {
-        'Roman': 2,
-        'Beach': 2,
-        'Slater': 1,
-        'Loft': 1,
-        'Logos': 1,
-        'Frank': 1,
-    }
+
+def get_fitness_batch(schedule: Schedule, population: Population):
+    # widen the int8 indices so the keys computed below can't overflow
+    facilitators, rooms, times = (axis.astype(np.intp) for axis in population.axes())
+    pop_size, num_activities = rooms.shape
+    num_facilitators = len(schedule.facilitators)
+    num_rooms = len(schedule.rooms)
+    num_times = len(schedule.times)
+    room_cluster = schedule.room_cluster[rooms]
+    individuals = np.arange(pop_size)[:, None]
+    activities = np.arange(num_activities)[None, :]
+
+    def get_loads(keys, num_keys):  # per individual histogram of keys, shape (pop_size, num_keys)
+        return np.bincount(
+            (individuals * num_keys + keys).ravel(),
+            minlength=pop_size * num_keys,
+        ).reshape(pop_size, num_keys)
+
+    fitness = np.zeros(pop_size)
 
     # activity fitness
-    for activity in schedule.activities.values():
-        room_time_load[activity.room, activity.time] += 1
-        facilitator_load[activity.facilitator] += 1
-        facilitator_time_load[activity.facilitator, activity.time] += 1
-        facilitator_time_building_schedule[activity.facilitator, activity.time].add(building_clusters[activity.room.building])
-
-        capacity_ratio = activity.room.capacity / activity.activity.expected_enrollment
-        if capacity_ratio < 1:
-            fitness -= 0.5
-        elif capacity_ratio > 3:
-            fitness -= 0.2
-        elif capacity_ratio > 6:
-            fitness -= 0.4
-        else:
-            fitness += 0.3
-
-        if activity.facilitator in activity.activity.preferred_facilitators:
-            fitness += 0.5
-        elif activity.facilitator in activity.activity.other_facilitators:
-            fitness += 0.2
-        else:
-            fitness -= 0.1
+    fitness += schedule.capacity_fitness[activities, rooms].sum(axis=1)
+    fitness += schedule.facilitator_fitness[activities, facilitators].sum(axis=1)
 
     # penalize room/time conflicts
-    for load in room_time_load.values():
-        if load >= 2:
-            fitness -= 0.5 * load
+    room_time_load = get_loads(rooms * num_times + times, num_rooms * num_times)
+    fitness -= 0.5 * np.where(room_time_load >= 2, room_time_load, 0).sum(axis=1)
 
     # penalize schedules that give professors too many or too few activities
-    for facilitator, load in facilitator_load.items():
-        if facilitator == 'Tyler' and load < 2:
-            continue
-
-        if load in (1, 2):  # apparently not 0 though
-            fitness -= 0.4
-        elif load > 4:
-            fitness -= 0.5
+    facilitator_load = get_loads(facilitators, num_facilitators)
+    load_penalty = np.select([(facilitator_load == 1) | (facilitator_load == 2), facilitator_load > 4], [0.4, 0.5], 0)
+    tyler = schedule.facilitators.index('Tyler')
+    load_penalty[facilitator_load[:, tyler] < 2, tyler] = 0
+    fitness -= load_penalty.sum(axis=1)
 
     # penalize (very lightly, apparently) schedules that require facilitators to be in multiple places at once
-    for load in facilitator_time_load.values():
-        if load > 1:  # apparently this is a one-time thing?
-            fitness -= 0.2
+    facilitator_times = facilitators * num_times + times
+    facilitator_time_load = get_loads(facilitator_times, num_facilitators * num_times)
+    fitness -= 0.2 * (facilitator_time_load > 1).sum(axis=1)
 
     # penalize schedules that require the instructor to travel far between consecutive activities, otherwise reward
-    for (facilitator, time), building_groups in facilitator_time_building_schedule.items():
-        for building_group in building_groups:  # Still O(num_activities)
-            prev = facilitator_time_building_schedule.get((facilitator, time - 1), tuple())
-            if len(prev) > 1 or (len(prev) == 1 and building_group not in prev):
-                fitness -= 0.4
-            else:
-                fitness += 0.5
+    # times are consecutive hours, so the previous hour is simply the previous time index
+    # building_groups holds a bitmask of the building clusters each facilitator is in at each time
+    building_groups = np.zeros(pop_size * num_facilitators * num_times, dtype=np.uint8)
+    np.bitwise_or.at(
+        building_groups,
+        (individuals * (num_facilitators * num_times) + facilitator_times).ravel(),
+        (1 << room_cluster).ravel(),
+    )
+    building_groups = building_groups.reshape(pop_size, num_facilitators, num_times)
+    prev = np.zeros_like(building_groups)
+    prev[:, :, 1:] = building_groups[:, :, :-1]
+    # every cluster visited is rewarded if the previous slot was empty or only in that same cluster
+    num_groups = CLUSTER_MASK_POPCOUNT[building_groups]
+    num_rewarded = np.where(
+        prev == 0, num_groups,
+        np.where(CLUSTER_MASK_POPCOUNT[prev] == 1, CLUSTER_MASK_POPCOUNT[building_groups & prev], 0),
+    )
+    fitness += (0.5 * num_rewarded - 0.4 * (num_groups - num_rewarded)).sum(axis=(1, 2))
 
     # "activity-specific adjustments"
-    sla101_gap = abs(schedule.activities['SLA101A'].time - schedule.activities['SLA101B'].time)
-    if sla101_gap > 4:
-        fitness += 0.5
-    elif sla101_gap == 0:
-        fitness -= 0.5
-
-    sla191_gap = abs(schedule.activities['SLA191A'].time - schedule.activities['SLA191B'].time)
-    if sla191_gap > 4:
-        fitness += 0.5
-    elif sla191_gap == 0:
-        fitness -= 0.5
-
-    for sla101 in (schedule.activities['SLA101A'], schedule.activities['SLA101B']):
-        for sla191 in (schedule.activities['SLA191A'], schedule.activities['SLA191B']):
-            gap = abs(sla101.time - sla191.time)
-            if gap == 1:
-                if building_clusters[sla101.room.building] == building_clusters[sla191.room.building]:
-                    fitness += 0.5
-                else:
-                    fitness -= 0.4
-            elif gap == 2:
-                fitness += 0.25
-            elif gap == 0:
-                fitness -= 0.25
+    sla101_times = times[:, schedule.sla101]
+    sla191_times = times[:, schedule.sla191]
+
+    for section_times in (sla101_times, sla191_times):
+        gap = np.abs(section_times[:, 0] - section_times[:, 1])
+        fitness += np.where(gap > 4, 0.5, np.where(gap == 0, -0.5, 0))
+
+    # every (SLA101 section, SLA191 section) pair at once, shape (pop_size, 2, 2)
+    gap = np.abs(sla101_times[:, :, None] - sla191_times[:, None, :])
+    same_cluster = room_cluster[:, schedule.sla101, None] == room_cluster[:, None, schedule.sla191]
+    fitness += np.select(
+        [gap == 1, gap == 2, gap == 0],
+        [np.where(same_cluster, 0.5, -0.4), 0.25, -0.25],
+        0,
+    ).sum(axis=(1, 2))
 
     return fitness
 
 
-def cross_schedules(schedule: Schedule, a: ScheduleAssignment, b: ScheduleAssignment, mutation_rate):
-    chiasma = random.randint(0, len(schedule.activities) - 1)
-    new_activities = {}
-    for i, activity in enumerate(schedule.activities):
-        activity_name = activity.get_id()
-        new_activities[activity_name] = (
-            ActivityAssignment.make_random_assignment(schedule, activity) if random.random() < mutation_rate
-            else a.activities[activity_name] if i < chiasma
-            else b.activities[activity_name]
-        )
+def get_population_fitness(schedule: Schedule, population: Population, out: np.ndarray):
+    if fitness_kernel is None:
+        out[:] = get_fitness_batch(schedule, population)
+        return out
+
+    fitness_kernel.evaluate_population(
+        *population.axes(),
+        schedule.room_cluster,
+        schedule.capacity_fitness,
+        schedule.facilitator_fitness,
+        len(schedule.facilitators),
+        len(schedule.rooms),
+        len(schedule.times),
+        schedule.facilitators.index('Tyler'),
+        *schedule.sla101,
+        *schedule.sla191,
+        out,
+    )
+    return out
+
+
+def cross_schedules(schedule: Schedule, population: Population, a, b, mutation_rate, rng, out: Population):
+    # child i of out is a cross between individuals a[i] and b[i] of population
+    num_children = len(a)
+    num_activities = len(schedule.activities)
+    chiasmata = rng.integers(0, num_activities, num_children)
+    from_a = np.arange(num_activities)[None, :] < chiasmata[:, None]
+    mutated = rng.random((num_children, num_activities)) < mutation_rate
+    mutations = Population.make_random(schedule, num_children, rng)
+
+    # 0 takes the gene from b, 1 from a, and 2 from the random mutation, shared by all three axes
+    source = np.where(mutated, 2, from_a)
+
+    for axis, mutation_axis, out_axis in zip(population.axes(), mutations.axes(), out.axes()):
+        np.choose(source, (axis[b], axis[a], mutation_axis), out=out_axis)
+
+    return out
 
-    return ScheduleAssignment(a.schedule, new_activities)
 
+def softmax(x: np.ndarray):
+    # single precision is plenty for selection weights, and everything after the copy happens in place
+    p = x.astype(np.float32)
+    p -= p.max()
+    np.exp(p, out=p)
+    p /= p.sum()
+    return p
 
-def get_next_generation(schedule, population, population_fitness, parent_pool_size, mutation_rate):
+
+def get_next_generation(schedule, population, population_fitness, parent_pool_size, mutation_rate, rng, out):
     softmax_pop_fitness = softmax(population_fitness)
-    parent_population = choice(population, parent_pool_size, replace=False, p=softmax_pop_fitness)
-    new_generation = []
-    for _ in population:
-        a, b = choice(parent_population, 2, replace=False)
-        new_generation.append(cross_schedules(schedule, a, b, mutation_rate))
+    parent_population = rng.choice(len(population), parent_pool_size, replace=False, p=softmax_pop_fitness)
+
+    # pick two distinct parents for every child
+    a = rng.integers(0, parent_pool_size, len(population))
+    b = (a + rng.integers(1, parent_pool_size, len(population))) % parent_pool_size
 
-    return new_generation
+    return cross_schedules(schedule, population, parent_population[a], parent_population[b], mutation_rate, rng, out)
 
 
-def print_schedule(schedule: ScheduleAssignment):
-    time_slots = {time: [] for time in schedule.schedule.times}
+def print_schedule(schedule: Schedule, population: Population, ix: int):
+    time_slots = [[] for _ in schedule.times]
 
-    for activity in schedule.activities.values():
-        time_slots[activity.time].append(activity)
+    for activity, facilitator_ix, room_ix, time_ix in zip(schedule.activities, *(axis[ix] for axis in population.axes())):
+        time_slots[time_ix].append((activity, schedule.facilitators[facilitator_ix], schedule.rooms[room_ix]))
 
-    for time, activities in time_slots.items():
+    for time, activities in zip(schedule.times, time_slots):
         print(f"{time: <2}:00", end=' | ')
         print(
             " | ".join(
-                f"{activity.activity.get_id(): <7} "
-                f"{activity.facilitator: <8} "
-                f"{activity.room.building: <5} "
-                f"{activity.room.number:0<3}"
-                for activity in activities
+                f"{activity.get_id(): <7} "
+                f"{facilitator: <8} "
+                f"{room.building: <5} "
+                f"{room.number:0<3}"
+                for activity, facilitator, room in activities
             )
         )
 
@@ -226,13 +291,18 @@ def main():
             activity['course number'],
             activity['section'],
             activity['expected enrollment'],
-            set(activity['preferred facilitators']),
-            set(activity['other facilitators']),
         )
         for activity in activity_info["activities"]
     ]
 
     facilitators = activity_info['facilitators']
+    facilitator_ix = {facilitator: i for i, facilitator in enumerate(facilitators)}
+
+    preferred = np.zeros((len(activities), len(facilitators)), dtype=bool)
+    other = np.zeros((len(activities), len(facilitators)), dtype=bool)
+    for i, activity in enumerate(activity_info["activities"]):
+        preferred[i, [facilitator_ix[facilitator] for facilitator in activity['preferred facilitators']]] = True
+        other[i, [facilitator_ix[facilitator] for facilitator in activity['other facilitators']]] = True
 
     rooms = [
         Room(
@@ -250,33 +320,53 @@ def main():
         facilitators,
         rooms,
         times,
+        preferred,
+        other,
     )
 
     POPULATION_SIZE = 500
     PARENT_POPULATION_SIZE = int(POPULATION_SIZE * 0.2)
     MUTATION_RATE_DECAY = 0.5
+    PATIENCE = 50  # generations without a new best fitness before giving up
     mutation_rate = 0.1
+    rng = np.random.default_rng()
+
+    # each generation is written into whichever of these buffers doesn't hold its parents
+    populations = [Population.make_random(schedule, POPULATION_SIZE, rng), Population.make_empty(schedule, POPULATION_SIZE)]
+    fitnesses = [np.empty(POPULATION_SIZE), np.empty(POPULATION_SIZE)]
 
-    population = [ScheduleAssignment.make_random_assignment(schedule) for _ in range(POPULATION_SIZE)]
-    population_fitness = [get_fitness(s) for s in population]
+    population, population_fitness = populations[0], fitnesses[0]
+    get_population_fitness(schedule, population, out=population_fitness)
+
+    best_fitness_seen = -np.inf
+    best_history = deque(maxlen=PATIENCE)
+    best_schedule = Population.make_empty(schedule, 1)
 
     for g in count():
-        avg_prev_population_fitness = sum(population_fitness) / len(population)
-        population = get_next_generation(schedule, population, population_fitness, PARENT_POPULATION_SIZE, mutation_rate)
-        population_fitness = [get_fitness(s) for s in population]
-        avg_population_fitness = sum(population_fitness) / len(population_fitness)
+        avg_prev_population_fitness = population_fitness.mean()
+        parents, parent_fitness = population, population_fitness
+        population, population_fitness = populations[(g + 1) % 2], fitnesses[(g + 1) % 2]
+        get_next_generation(schedule, parents, parent_fitness, PARENT_POPULATION_SIZE, mutation_rate, rng, out=population)
+        get_population_fitness(schedule, population, out=population_fitness)
 
         print(f"generation {g} has average fitness {avg_prev_population_fitness}")
 
-        if g > 100:
-            if avg_population_fitness / avg_prev_population_fitness < 1.01:
-                break
+        # generations don't keep their elites, so remember the best schedule as soon as it shows up
+        best_schedule_ix = population_fitness.argmax()
+        if population_fitness[best_schedule_ix] > best_fitness_seen:
+            best_fitness_seen = population_fitness[best_schedule_ix]
+            for axis, best_axis in zip(population.axes(), best_schedule.axes()):
+                best_axis[0] = axis[best_schedule_ix]
 
+        best_history.append(best_fitness_seen)
+        if len(best_history) == PATIENCE and max(best_history) <= best_history[0]:
+            break
+
+        if g > 100:
             mutation_rate *= MUTATION_RATE_DECAY
 
-    best_schedule_ix, best_fitness = max(enumerate(population_fitness), key=lambda p: p[1])
-    print(f"Best Schedule with fitness {best_fitness} was:")
-    print_schedule(population[best_schedule_ix])
+    print(f"Best Schedule with fitness {best_fitness_seen} was:")
+    print_schedule(schedule, best_schedule, 0)
 
 
 if __name__ == '__main__':
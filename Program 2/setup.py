@@ -0,0 +1,13 @@
+# builds the optional fitness_cython extension in place: python setup.py build_ext --inplace
+from setuptools import Extension, setup
+from Cython.Build import cythonize
+
+setup(
+    ext_modules=cythonize(
+        Extension(
+            "fitness_cython",
+            ["fitness_cython.pyx"],
+            extra_compile_args=["-O3", "-march=native"],
+        ),
+    ),
+)